@@ -0,0 +1,64 @@
+"""彙總效能基準：產生合成事件區段，量測 load_events + summarize 的耗時。
+
+    python benchmarks/bench_event_store.py --rows 3000000 --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyarrow as pa
+
+import event_store
+
+SOURCES = ['random', 'formula', 'color_code', 'preview', 'facelet']
+PRESETS = ["(右手上左下右)R U R' U'", "(左手上右下左)L' U' L U", "(右手小魚)R U R' U R U' U' R'"]
+
+
+def synthetic_table(rows, seed=0):
+    rng = random.Random(seed)
+    events = [rng.random() < 0.8 for _ in range(rows)]
+    ok = [rng.random() > 0.05 for _ in range(rows)]
+    return pa.table({
+        'ts': pa.array(range(rows), pa.int64()),
+        'event': ['solve' if e else 'rotate' for e in events],
+        'source': [rng.choice(SOURCES) for _ in range(rows)],
+        'input': [f'input-{rng.randrange(5000)}' for _ in range(rows)],
+        'solution_length': pa.array([rng.randint(14, 23) if k else None for k in ok], pa.int16()),
+        'latency_ms': pa.array([rng.uniform(1, 80) for _ in range(rows)], pa.float32()),
+        'preset': [None if e else rng.choice(PRESETS) for e in events],
+        'ok': ok,
+        'error': [None if k else 'Error: invalid cube' for k in ok],
+    }).cast(event_store.EVENT_SCHEMA)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=3_000_000)
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        per_segment = args.rows // args.segments
+        for i in range(args.segments):
+            event_store._write_atomic(synthetic_table(per_segment, seed=i),
+                                      os.path.join(directory, event_store._segment_name(i, i)))
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            table = event_store.load_events(directory)
+            event_store.summarize(table)
+            timings.append(time.perf_counter() - start)
+
+    print(f'{table.num_rows:,} rows, {args.segments} segments: '
+          f'median {statistics.median(timings):.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s')
+
+
+if __name__ == '__main__':
+    main()
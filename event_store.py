@@ -0,0 +1,426 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.json as pa_json
+
+logger = logging.getLogger(__name__)
+
+# ---------- 事件欄位（Arrow IPC 欄式格式） ----------
+EVENT_SCHEMA = pa.schema([
+    ('ts', pa.timestamp('ms')),
+    ('event', pa.dictionary(pa.int8(), pa.string())),      # solve / rotate
+    ('source', pa.dictionary(pa.int8(), pa.string())),     # random / formula / facelet / ...
+    ('input', pa.string()),                                # 打亂公式或 Facelet 字串
+    ('solution_length', pa.int16()),
+    ('latency_ms', pa.float32()),
+    ('preset', pa.dictionary(pa.int16(), pa.string())),
+    ('ok', pa.bool_()),
+    ('error', pa.string()),
+])
+
+# JSON 日誌讀取時使用的純量型別（字典編碼於壓實時再套用）
+_LOG_SCHEMA = pa.schema([
+    ('ts', pa.int64()),
+    ('event', pa.string()),
+    ('source', pa.string()),
+    ('input', pa.string()),
+    ('solution_length', pa.int16()),
+    ('latency_ms', pa.float32()),
+    ('preset', pa.string()),
+    ('ok', pa.bool_()),
+    ('error', pa.string()),
+])
+
+DEFAULT_DIR = os.environ.get(
+    'CUBE_EVENTS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'events')
+)
+
+LOG_NAME = 'events.jsonl'
+FLUSH_INTERVAL = 1.0        # 秒：背景執行緒最長多久寫入一次日誌
+COMPACT_INTERVAL = 60.0     # 秒：最長多久把日誌壓實成 Arrow 區段
+COMPACT_EVENTS = 50_000     # 日誌累積多少筆就提前壓實
+MERGE_FANOUT = 8            # 同一大小層級累積這麼多個區段就合併
+MERGE_BASE_BYTES = 1 << 20  # 小於此大小的區段都算最低層級
+QUEUE_SIZE = 100_000
+
+
+# ---------- 區段檔名：seg-<起始編號>-<結束編號>.arrow ----------
+def _segment_name(first, last):
+    return f'seg-{first:020d}-{last:020d}.arrow'
+
+
+def _parse_segment_name(name):
+    if not (name.startswith('seg-') and name.endswith('.arrow')):
+        return None
+    try:
+        first, last = name[4:-6].split('-')
+        return int(first), int(last)
+    except ValueError:
+        return None
+
+
+def _parse_pending_name(name):
+    parts = name.split('.')
+    if len(parts) == 3 and parts[0] == 'events' and parts[1].isdigit() and parts[2] == 'jsonl':
+        return int(parts[1])
+    return None
+
+
+def _all_segments(directory):
+    found = []
+    for name in os.listdir(directory):
+        ids = _parse_segment_name(name)
+        if ids:
+            found.append((ids[0], ids[1], os.path.join(directory, name)))
+    return found
+
+
+def list_segments(directory=DEFAULT_DIR):
+    """回傳目前有效的區段 [(first, last, path)]，已被合併檔涵蓋的舊區段會略過。"""
+    if not os.path.isdir(directory):
+        return []
+    found = _all_segments(directory)
+    # 涵蓋範圍大的優先，合併中途當機留下的舊區段就不會重複計算
+    found.sort(key=lambda s: (s[0], -s[1]))
+    kept = []
+    for first, last, path in found:
+        if kept and first <= kept[-1][1]:
+            continue
+        kept.append((first, last, path))
+    return kept
+
+
+def _size_tier(size):
+    # 每大 MERGE_FANOUT 倍算一個層級
+    tier = 0
+    while size >= MERGE_BASE_BYTES:
+        size //= MERGE_FANOUT
+        tier += 1
+    return tier
+
+
+def _write_atomic(table, path):
+    # IPC 檔案每個欄位只能有一份字典，寫入前先統一
+    table = table.unify_dictionaries().combine_chunks()
+    tmp = path + '.tmp'
+    with pa.OSFile(tmp, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def _read_log(source):
+    if isinstance(source, str) and os.path.getsize(source) == 0:
+        return EVENT_SCHEMA.empty_table()
+    table = pa_json.read_json(
+        source,
+        parse_options=pa_json.ParseOptions(explicit_schema=_LOG_SCHEMA,
+                                           unexpected_field_behavior='ignore'),
+    )
+    return table.select(_LOG_SCHEMA.names).cast(EVENT_SCHEMA)
+
+
+# ---------- 背景寫入器 ----------
+class EventStore:
+    """只追加的事件日誌：record() 僅放入佇列，寫檔與壓實都在背景執行緒完成。"""
+
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.dropped = 0
+        self.last_error = None      # 背景執行緒最近一次失敗的例外，成功寫入後清除
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._log_events = 0
+        self._log_size = 0
+        self._last_compact = time.monotonic()
+        self._next_seq = 0
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self._log = open(self.log_path, 'ab')
+        self._thread = threading.Thread(target=self._run, name='cube-event-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def alive(self):
+        return self._thread.is_alive()
+
+    def record(self, event, source, input='', solution_length=None, latency_ms=None,
+               preset=None, ok=True, error=None):
+        row = {
+            'ts': int(time.time() * 1000),
+            'event': event,
+            'source': source,
+            'input': input,
+            'solution_length': solution_length,
+            'latency_ms': latency_ms,
+            'preset': preset,
+            'ok': ok,
+            'error': error,
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._drop(1)
+
+    def flush(self, timeout=5.0):
+        """要求背景執行緒立即把佇列中的事件寫入日誌，成功時回傳 True。"""
+        return self._request('flush', timeout)
+
+    def compact(self, timeout=10.0):
+        """要求背景執行緒立即寫出並壓實，成功時回傳 True。"""
+        return self._request('compact', timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10.0)
+
+    def _request(self, kind, timeout):
+        if not self._thread.is_alive():
+            return False
+        # put 與 wait 共用同一個期限，整體最多等 timeout 秒
+        deadline = time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put((kind, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(max(0.0, deadline - time.monotonic())) and self.last_error is None
+
+    def _drop(self, count):
+        if not self.dropped:
+            logger.warning('事件佇列已滿，開始丟棄事件')
+        self.dropped += count
+
+    # ----- 以下只在背景執行緒中執行 -----
+    def _run(self):
+        rows = []
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+            if isinstance(item, dict):
+                rows.append(item)
+                if len(rows) < 1000 and time.monotonic() < deadline:
+                    continue
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            try:
+                self._flush(rows)
+                rows = []
+                if item is None:
+                    self._compact()
+                elif isinstance(item, tuple):
+                    if item[0] == 'compact':
+                        self._compact()
+                elif (self._log_events >= COMPACT_EVENTS
+                      or time.monotonic() - self._last_compact >= COMPACT_INTERVAL):
+                    self._compact()
+                self.last_error = None
+            except Exception as e:
+                # 寫入失敗時保留尚未寫出的事件下次再試，執行緒不能因此停止
+                logger.warning('事件寫入失敗，稍後重試', exc_info=True)
+                self.last_error = e
+                if len(rows) > QUEUE_SIZE:
+                    self._drop(len(rows) - QUEUE_SIZE)
+                    rows = rows[-QUEUE_SIZE:]
+            if isinstance(item, tuple):
+                item[1].set()
+            if item is None:
+                self._log.close()
+                return
+
+    def _flush(self, rows):
+        if not rows:
+            return
+        data = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in rows).encode('utf-8')
+        try:
+            self._log.write(data)
+            self._log.flush()
+        except (OSError, ValueError):
+            # 可能只寫了一部分：重新開檔並截回上次成功的長度，避免重試時出現半行或重複
+            self._reopen_log()
+            raise
+        self._log_size += len(data)
+        self._log_events += len(rows)
+
+    def _reopen_log(self):
+        try:
+            self._log.close()
+        except OSError:
+            pass
+        self._log = open(self.log_path, 'ab')
+        self._log.truncate(self._log_size)
+
+    def _compact(self):
+        self._last_compact = time.monotonic()
+        if self._log_events:
+            # 先把日誌改名成 events.<編號>.jsonl，區段寫好後再刪除；
+            # 編號是遞增計數器而非時鐘，時鐘倒退時新區段才不會落在已合併的範圍內
+            self._log.close()
+            try:
+                os.replace(self.log_path, os.path.join(self.directory, f'events.{self._next_seq}.jsonl'))
+                self._next_seq += 1
+                self._log_events = 0
+                self._log_size = 0
+            finally:
+                self._log = open(self.log_path, 'ab')
+        self._seal_pending()
+        try:
+            self._merge_tiers()
+        except (OSError, pa.ArrowException):
+            # 合併失敗不影響資料，下次壓實再試
+            logger.warning('事件區段合併失敗', exc_info=True)
+
+    def _seal_pending(self):
+        for name in sorted(os.listdir(self.directory)):
+            seq = _parse_pending_name(name)
+            if seq is None:
+                continue
+            pending = os.path.join(self.directory, name)
+            path = os.path.join(self.directory, _segment_name(seq, seq))
+            try:
+                if not os.path.exists(path):
+                    _write_atomic(_read_log(pending), path)
+                os.remove(pending)
+            except pa.ArrowInvalid:
+                # 無法解析的日誌移到一旁，不要擋住其他日誌封存
+                logger.warning('無法解析事件日誌 %s，改名為 .bad 略過', name, exc_info=True)
+                try:
+                    os.replace(pending, pending + '.bad')
+                except OSError:
+                    pass
+            except OSError:
+                logger.warning('封存事件日誌 %s 失敗，下次壓實再試', name, exc_info=True)
+
+    def _merge_tiers(self):
+        # 分層合併：只把最新、同一大小層級的區段湊滿 MERGE_FANOUT 個再合併，
+        # 已經合併過的大區段不會每次被重寫，每筆事件最多被重寫 log(總量) 次
+        while True:
+            segments = list_segments(self.directory)
+            if not segments:
+                return
+            tiers = [_size_tier(os.path.getsize(path)) for _, _, path in segments]
+            run = 1
+            while run < len(segments) and tiers[-run - 1] <= tiers[-1]:
+                run += 1
+            if run < MERGE_FANOUT:
+                return
+            self._merge(segments[-run:])
+
+    def _merge(self, segments):
+        table = pa.concat_tables(read_segment(path) for _, _, path in segments)
+        _write_atomic(table, os.path.join(self.directory, _segment_name(segments[0][0], segments[-1][1])))
+        for _, _, path in segments:
+            os.remove(path)
+
+    def _recover(self):
+        # 上次程式在壓實途中結束：清掉寫到一半的暫存檔，未封存的日誌留給下次壓實
+        for name in os.listdir(self.directory):
+            if name.endswith('.arrow.tmp'):
+                os.remove(os.path.join(self.directory, name))
+        # 從現有區段與未封存日誌的最大編號接續
+        seqs = [last for _, last, _ in _all_segments(self.directory)]
+        names = [name.removesuffix('.bad') for name in os.listdir(self.directory)]
+        seqs += [seq for seq in map(_parse_pending_name, names) if seq is not None]
+        self._next_seq = max(seqs, default=-1) + 1
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path):
+            with open(self.log_path, 'rb+') as f:
+                data = f.read()
+                # 丟掉當機時只寫了一半的最後一行
+                self._log_size = data.rfind(b'\n') + 1
+                f.truncate(self._log_size)
+            self._log_events = data.count(b'\n')
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """整個行程共用一個 EventStore（Streamlit 每次 rerun 不會重新 import 模組）。"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EventStore()
+        return _store
+
+
+# ---------- 記憶體映射讀取與彙總 ----------
+def read_segment(path):
+    with pa.memory_map(path, 'r') as source:
+        return ipc.open_file(source).read_all()
+
+
+def read_log_tail(directory=DEFAULT_DIR, size=None):
+    """讀取尚未壓實的 events.jsonl 前 size 位元組（只取完整的行）。"""
+    try:
+        with open(os.path.join(directory, LOG_NAME), 'rb') as f:
+            data = f.read(size)
+    except FileNotFoundError:
+        return EVENT_SCHEMA.empty_table()
+    data = data[:data.rfind(b'\n') + 1]
+    if not data:
+        return EVENT_SCHEMA.empty_table()
+    return _read_log(pa.BufferReader(data))
+
+
+def load_events(directory=DEFAULT_DIR, paths=None, log_size=0):
+    """讀取所有有效區段；指定 paths 時只讀這些檔案，log_size 不為 0 時一併讀入日誌尾端。"""
+    if paths is None:
+        paths = [path for _, _, path in list_segments(directory)]
+    tables = [read_segment(path) for path in paths]
+    if log_size:
+        tables.append(read_log_tail(directory, log_size))
+    if not tables:
+        return EVENT_SCHEMA.empty_table()
+    return pa.concat_tables(tables, promote_options='permissive')
+
+
+def _counts(array, name, limit=None):
+    counts = pc.value_counts(array.drop_null())
+    table = pa.table({name: counts.field('values'), 'count': counts.field('counts')})
+    table = table.sort_by([('count', 'descending')])
+    return table.slice(0, limit) if limit else table
+
+
+def summarize(table, top=20):
+    solves = table.filter(pc.equal(table['event'].cast(pa.string()), 'solve'))
+    solved = solves.filter(solves['ok'])
+    failed = solves.filter(pc.invert(solves['ok']))
+    latency = solved['latency_ms']
+
+    lengths = _counts(solved['solution_length'], 'solution_length').sort_by('solution_length')
+    failures = (failed.group_by(['input', 'error']).aggregate([('ts', 'count'), ('ts', 'max')])
+                .rename_columns(['input', 'error', 'count', 'last_seen'])
+                .sort_by([('count', 'descending')])
+                .slice(0, top))
+    rotates = table.filter(pc.equal(table['event'].cast(pa.string()), 'rotate'))
+
+    return {
+        'events': table.num_rows,
+        'solves': solved.num_rows,
+        'failures': failed.num_rows,
+        'mean_length': pc.mean(solved['solution_length']).as_py(),
+        'latency': {
+            'mean': pc.mean(latency).as_py(),
+            'p50': pc.quantile(latency, 0.5)[0].as_py() if len(latency) else None,
+            'p95': pc.quantile(latency, 0.95)[0].as_py() if len(latency) else None,
+            'max': pc.max(latency).as_py(),
+        },
+        'lengths': lengths,
+        'sources': _counts(solves['source'].cast(pa.string()), 'source'),
+        'presets': _counts(rotates['preset'].cast(pa.string()), 'preset', top),
+        'failing_inputs': failures,
+    }
@@ -0,0 +1,85 @@
+import streamlit as st
+import time
+import os
+import event_store
+from event_store import get_store
+
+# ---------- 統計分析頁面 ----------
+st.set_page_config(page_title="魔術方塊統計分析", layout="centered")
+st.title("📊 打亂 / 解法統計分析")
+
+# 已壓實的 Arrow 區段以記憶體映射讀取，尚未壓實的事件直接讀 events.jsonl 尾端；
+# 這裡只要求寫出佇列，不強制壓實，才不會每次瀏覽都產生一個小區段
+store = get_store()
+if not store.alive:
+    st.error(f"❌ 事件寫入器已停止，新的事件不會再被記錄。最後的錯誤：{store.last_error}")
+elif not store.flush():
+    if store.last_error is not None:
+        st.error(f"❌ 事件寫入失敗，正在重試：{store.last_error}")
+    else:
+        st.warning("⚠️ 事件寫入器忙碌中，最新的事件可能尚未列入統計。")
+if store.dropped:
+    st.warning(f"⚠️ 事件佇列曾經滿載，已遺失 {store.dropped:,} 筆事件。")
+
+# 區段與日誌都沒變就直接使用快取的彙總結果；只保留最近幾份
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_summary(segments, log_stat):
+    start = time.perf_counter()
+    table = event_store.load_events(paths=[path for path, _ in segments], log_size=log_stat[0])
+    summary = event_store.summarize(table)
+    for key in ('lengths', 'sources', 'presets', 'failing_inputs'):
+        summary[key] = summary[key].to_pandas()
+    summary['elapsed_ms'] = (time.perf_counter() - start) * 1000
+    return summary
+
+try:
+    # 先列區段再量日誌長度：期間若剛好壓實，只會暫時少算、不會重複計算
+    segments = tuple(
+        (path, os.path.getmtime(path)) for _, _, path in event_store.list_segments()
+    )
+    log_path = os.path.join(event_store.DEFAULT_DIR, event_store.LOG_NAME)
+    log_stat = (os.path.getsize(log_path), os.path.getmtime(log_path)) if os.path.exists(log_path) else (0, 0)
+    summary = load_summary(segments, log_stat)
+except FileNotFoundError:
+    # 列出區段後剛好有合併刪掉了舊檔，重新整理一次
+    st.rerun()
+
+if summary['events'] == 0:
+    st.info("目前還沒有任何事件紀錄，先到主頁面打亂或還原方塊吧！")
+    st.stop()
+
+st.caption(f"共 {summary['events']:,} 筆事件，{len(segments)} 個區段，彙總耗時 {summary['elapsed_ms']:.0f} ms")
+
+col1, col2, col3 = st.columns(3)
+col1.metric("成功求解", f"{summary['solves']:,}")
+col2.metric("求解失敗", f"{summary['failures']:,}")
+col3.metric("平均解法步數", f"{summary['mean_length']:.1f}" if summary['mean_length'] is not None else "—")
+
+# ---------- 解法步數分布 ----------
+st.subheader("📏 解法步數分布")
+st.bar_chart(summary['lengths'], x='solution_length', y='count')
+
+# ---------- 求解耗時 ----------
+st.subheader("⏱️ 求解耗時（毫秒）")
+latency = summary['latency']
+col1, col2, col3, col4 = st.columns(4)
+for col, label, key in ((col1, "平均", 'mean'), (col2, "P50", 'p50'), (col3, "P95", 'p95'), (col4, "最大", 'max')):
+    col.metric(label, f"{latency[key]:.1f}" if latency[key] is not None else "—")
+
+# ---------- 求解來源 ----------
+st.subheader("🧭 求解來源")
+st.bar_chart(summary['sources'], x='source', y='count')
+
+# ---------- 最常用的預設公式 ----------
+st.subheader("🔄 最常用的預設公式")
+if summary['presets'].empty:
+    st.write("尚未使用任何預設公式。")
+else:
+    st.dataframe(summary['presets'], hide_index=True, use_container_width=True)
+
+# ---------- 失敗輸入 ----------
+st.subheader("❌ 最常失敗的輸入")
+if summary['failing_inputs'].empty:
+    st.write("目前沒有失敗紀錄。")
+else:
+    st.dataframe(summary['failing_inputs'], hide_index=True, use_container_width=True)
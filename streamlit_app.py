@@ -3,9 +3,11 @@ import pycuber as pc
 import kociemba
 import matplotlib.pyplot as plt
 import random
+import time
 from io import BytesIO
 from collections import Counter
 import re
+from event_store import get_store
 
 # ---------- 顏色對應 ----------
 color_map = {
@@ -137,6 +139,25 @@ def to_facelet_str(cube):
                 result += colour_to_facelet[sticker.colour]
     return result
 
+# ---------- 求解並記錄事件（寫入由背景執行緒處理，不會卡住 rerun） ----------
+# input 是使用者實際輸入的內容（打亂公式、顏色代碼或 Facelet 字串），統計時依此分組
+def solve_and_record(facelets, source, input):
+    start = time.perf_counter()
+    try:
+        solution = kociemba.solve(facelets)
+    except Exception as e:
+        get_store().record('solve', source, input=input,
+                           latency_ms=(time.perf_counter() - start) * 1000, ok=False, error=str(e))
+        raise
+    get_store().record('solve', source, input=input,
+                       solution_length=len(solution.split()),
+                       latency_ms=(time.perf_counter() - start) * 1000)
+    return solution
+
+# 輸入檢查沒通過、根本沒送進 kociemba 的也記成失敗
+def record_rejected(source, input, error):
+    get_store().record('solve', source, input=input, ok=False, error=error)
+
 # ---------- Streamlit App ----------
 st.set_page_config(page_title="魔術方塊還原動畫", layout="centered")
 st.title("🧊 魔術方塊還原動畫器")
@@ -155,7 +176,7 @@ if st.button("🎲 隨機打亂方塊"):
     cube(pc.Formula(scramble))
     facelets = to_facelet_str(cube)
     try:
-        solution = kociemba.solve(facelets)
+        solution = solve_and_record(facelets, 'random', input=scramble)
         st.session_state.scramble = scramble
         st.session_state.solution = solution
         st.session_state.states = [cube.copy()]
@@ -177,7 +198,7 @@ if st.button("✅ 套用打亂公式"):
         cube = pc.Cube()
         cube(pc.Formula(scramble))
         facelets = to_facelet_str(cube)
-        solution = kociemba.solve(facelets)
+        solution = solve_and_record(facelets, 'formula', input=scramble)
         st.session_state.scramble = scramble
         st.session_state.solution = solution
         st.session_state.states = [cube.copy()]
@@ -208,8 +229,10 @@ if st.button("🎨 轉換並驗證 Facelet 字串"):
     cleaned = color_code_input.strip().lower().replace(' ', '')
     if len(cleaned) != 54:
         st.error("❌ 請輸入剛好 54 個字元的顏色代碼。")
+        record_rejected('color_code', cleaned, "字元數量錯誤")
     elif any(c not in color_mapping for c in cleaned):
         st.error(f"❌ 發現未定義的顏色字元：{set(c for c in cleaned if c not in color_mapping)}")
+        record_rejected('color_code', cleaned, "未定義的顏色字元")
     else:
         try:
             converted = ''.join(color_mapping[c] for c in cleaned)
@@ -219,7 +242,7 @@ if st.button("🎨 轉換並驗證 Facelet 字串"):
 
             # 嘗試還原，驗證是否合法
             try:
-                _ = kociemba.solve(converted)
+                _ = solve_and_record(converted, 'color_code', input=cleaned)
                 st.success("✅ 這是一個合法的魔術方塊狀態！可以還原的。")
             except Exception as e:
                 st.error(f"❌ 無法還原，這是一個非法的狀態。\n錯誤訊息：{e}")
@@ -253,11 +276,13 @@ if invalid_chars:
 if st.button("📸 預覽輸入狀態（不解）"):
     if input_len != 54:
         st.error("❌ 字元數量錯誤，請輸入剛好 54 個 URFDLB 字元。")
+        record_rejected('preview', input_str, "字元數量錯誤")
     elif invalid_chars:
         st.error("❌ 含有非法字元，僅能包含 U、R、F、D、L、B。")
+        record_rejected('preview', input_str, "含有非法字元")
     else:
         try:
-            solution = kociemba.solve(input_str)
+            solution = solve_and_record(input_str, 'preview', input=input_str)
             cube = pc.Cube()
             for move in solution.split()[::-1]:
                 if move.endswith("'"):
@@ -281,8 +306,10 @@ if st.button("🧠 開始解法還原"):
     input_len = len(input_str)
     if input_len != 54:
         st.error("❌ 字元數量錯誤，請輸入剛好 54 個 URFDLB 字元。")
+        record_rejected('facelet', input_str, "字元數量錯誤")
     elif invalid_chars:
         st.error("❌ 含有非法字元，僅能包含 U、R、F、D、L、B。")
+        record_rejected('facelet', input_str, "含有非法字元")
     else:
         facelet_count = Counter(input_str)
         with st.expander("📈 Facelet 字元分布分析"):
@@ -292,9 +319,10 @@ if st.button("🧠 開始解法還原"):
 
         if any(v != 9 for v in facelet_count.values()):
             st.error(f"❌ Facelet 字元數量錯誤：{dict(facelet_count)}")
+            record_rejected('facelet', input_str, "各面字元數量不是 9")
         else:
             try:
-                solution = kociemba.solve(input_str)
+                solution = solve_and_record(input_str, 'facelet', input=input_str)
                 
                 # 從還原狀態開始反推回 scramble 狀態
                 cube = pc.Cube()
@@ -590,6 +618,10 @@ if st.session_state.states:
                 st.session_state.states = st.session_state.states[:st.session_state.current_step + 1]
                 st.session_state.states.append(new_cube)
                 st.session_state.current_step += 1
+                is_preset = rotate_formula == preset_formulas[selected_formula]
+                get_store().record('rotate', 'preset' if is_preset else 'custom',
+                                   input=' '.join(moves),
+                                   preset=selected_formula if is_preset else None)
                 st.rerun()
         except Exception as e:
             st.error(f"❌ 旋轉公式錯誤：{e}")
@@ -0,0 +1,185 @@
+import json
+
+import pytest
+
+import event_store
+from event_store import EventStore, list_segments, load_events
+
+
+def _row(input, ts=0, ok=True):
+    return {'ts': ts, 'event': 'solve', 'source': 'formula', 'input': input,
+            'solution_length': 20 if ok else None, 'latency_ms': 1.5,
+            'preset': None, 'ok': ok, 'error': None if ok else 'bad'}
+
+
+def _write_log(path, rows, tail=''):
+    path.write_text(''.join(json.dumps(r) + '\n' for r in rows) + tail, encoding='utf-8')
+
+
+def _write_segment(directory, first, last, rows):
+    log = directory / 'tmp.jsonl'
+    _write_log(log, rows)
+    event_store._write_atomic(event_store._read_log(str(log)),
+                              str(directory / event_store._segment_name(first, last)))
+    log.unlink()
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    stores = []
+
+    def factory():
+        store = EventStore(str(tmp_path))
+        stores.append(store)
+        return store
+
+    yield factory
+    for store in stores:
+        store.close()
+
+
+def test_record_compact_load_round_trip(tmp_path, open_store):
+    store = open_store()
+    store.record('solve', 'random', input="R U", solution_length=19, latency_ms=3.0)
+    store.record('solve', 'facelet', input='X' * 54, ok=False, error='Error: invalid')
+    store.record('rotate', 'preset', input="R U R' U'", preset='(右手上左下右)')
+    assert store.compact()
+
+    table = load_events(str(tmp_path))
+    assert table.schema == event_store.EVENT_SCHEMA
+    rows = table.to_pylist()
+    assert [r['input'] for r in rows] == ["R U", 'X' * 54, "R U R' U'"]
+    assert rows[0]['solution_length'] == 19
+    assert rows[1]['ok'] is False and rows[1]['error'] == 'Error: invalid'
+    assert rows[2]['preset'] == '(右手上左下右)'
+    assert not (tmp_path / 'events.jsonl').read_text()
+
+    summary = event_store.summarize(table)
+    assert (summary['solves'], summary['failures']) == (1, 1)
+
+
+def test_merge_when_too_many_segments(tmp_path, open_store, monkeypatch):
+    monkeypatch.setattr(event_store, 'MERGE_FANOUT', 3)
+    store = open_store()
+    for i in range(5):
+        store.record('solve', 'random', input=str(i))
+        assert store.compact()
+
+    # 全部都是最低層級的小區段：第 3 次壓實合併成 0-2，第 5 次再與 3、4 合併
+    assert [s[:2] for s in list_segments(str(tmp_path))] == [(0, 4)]
+    assert sorted(load_events(str(tmp_path))['input'].to_pylist()) == ['0', '1', '2', '3', '4']
+
+
+def test_merge_leaves_large_segments_alone(tmp_path, open_store, monkeypatch):
+    monkeypatch.setattr(event_store, 'MERGE_FANOUT', 3)
+    _write_segment(tmp_path, 0, 9, [_row('x' * 1000) for _ in range(100)])
+    big = tmp_path / event_store._segment_name(0, 9)
+    monkeypatch.setattr(event_store, 'MERGE_BASE_BYTES', big.stat().st_size // 2)
+    store = open_store()
+    for i in range(6):
+        store.record('solve', 'random', input=str(i))
+        assert store.compact()
+
+    assert big.exists()
+    assert [s[:2] for s in list_segments(str(tmp_path))][0] == (0, 9)
+    assert load_events(str(tmp_path)).num_rows == 106
+
+
+def test_interrupted_merge_does_not_double_count(tmp_path):
+    _write_segment(tmp_path, 0, 0, [_row('a')])
+    _write_segment(tmp_path, 1, 1, [_row('b')])
+    _write_segment(tmp_path, 0, 1, [_row('a'), _row('b')])
+
+    assert [s[:2] for s in list_segments(str(tmp_path))] == [(0, 1)]
+    assert load_events(str(tmp_path)).num_rows == 2
+
+
+def test_new_segments_follow_merged_range(tmp_path, open_store):
+    # 新區段編號必須接在既有範圍之後，否則會被 list_segments 當成已合併而略過
+    _write_segment(tmp_path, 0, 25, [_row('old')])
+    store = open_store()
+    store.record('solve', 'random', input='new')
+    assert store.compact()
+
+    assert sorted(load_events(str(tmp_path))['input'].to_pylist()) == ['new', 'old']
+
+
+def test_restart_recovers_truncated_log_and_pending(tmp_path, open_store):
+    _write_log(tmp_path / 'events.3.jsonl', [_row('pending')])
+    _write_log(tmp_path / 'events.jsonl', [_row('complete')], tail='{"ts": 1, "event": "so')
+    (tmp_path / (event_store._segment_name(2, 2) + '.tmp')).write_bytes(b'garbage')
+
+    store = open_store()
+    assert store.compact()
+
+    assert sorted(load_events(str(tmp_path))['input'].to_pylist()) == ['complete', 'pending']
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'events.jsonl', event_store._segment_name(3, 3), event_store._segment_name(4, 4),
+    ]
+
+
+def test_unreadable_pending_log_is_moved_aside(tmp_path, open_store):
+    (tmp_path / 'events.0.jsonl').write_text('not json\n', encoding='utf-8')
+    _write_log(tmp_path / 'events.1.jsonl', [_row('ok')])
+
+    store = open_store()
+    assert store.compact()
+
+    assert (tmp_path / 'events.0.jsonl.bad').exists()
+    assert not (tmp_path / 'events.0.jsonl').exists()
+    assert load_events(str(tmp_path))['input'].to_pylist() == ['ok']
+
+
+def test_writer_survives_failed_write(tmp_path, open_store):
+    store = open_store()
+    store._log.close()      # 模擬磁碟錯誤：下一次寫入會失敗
+    store.record('solve', 'random', input='first')
+    assert not store.flush()
+    assert store.alive and store.last_error is not None
+
+    store.record('solve', 'random', input='second')
+    assert store.compact()
+    assert sorted(load_events(str(tmp_path))['input'].to_pylist()) == ['first', 'second']
+
+
+def test_writer_survives_failed_rotation(tmp_path, open_store, monkeypatch):
+    store = open_store()
+    store.record('solve', 'random', input='first')
+    real_replace = event_store.os.replace
+    calls = []
+
+    def failing_replace(src, dst):
+        calls.append(dst)
+        if len(calls) == 1:
+            raise OSError('disk full')
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(event_store.os, 'replace', failing_replace)
+    assert not store.compact()
+    assert store.alive
+
+    store.record('solve', 'random', input='second')
+    assert store.compact()
+    assert sorted(load_events(str(tmp_path))['input'].to_pylist()) == ['first', 'second']
+
+
+def test_requests_fail_fast_when_writer_stopped(tmp_path, open_store):
+    store = open_store()
+    store.close()
+    assert not store.alive
+    assert not store.flush(timeout=30)
+
+
+def test_load_events_reads_uncompacted_log_tail(tmp_path, open_store):
+    store = open_store()
+    store.record('solve', 'random', input='sealed')
+    assert store.compact()
+    store.record('solve', 'random', input='pending')
+    assert store.flush()
+
+    log_size = (tmp_path / 'events.jsonl').stat().st_size
+    with open(tmp_path / 'events.jsonl', 'ab') as f:
+        f.write(b'{"ts": 1, "event": "so')     # 寫到一半的行不算
+    table = load_events(str(tmp_path), log_size=log_size + 10)
+    assert sorted(table['input'].to_pylist()) == ['pending', 'sealed']
+    assert len(list_segments(str(tmp_path))) == 1